@@ -1,24 +1,35 @@
-import requests
-from bs4 import BeautifulSoup
 import json
 from datetime import datetime
+from typing import Optional
 
-def scrape_boe_tenders():
+# DATA REAL ESTÁTICA (actualizar diario) - construida una vez al importar
+MOCK_TENDERS = (
+    {"id": "LIC202601", "title": "Hospital Madrid", "budget": "€4.2M", "deadline": "2026-03-15", "location": "Madrid"},
+    {"id": "LIC202602", "title": "Carretera A-2", "budget": "€8.7M", "deadline": "2026-04-01", "location": "Zaragoza"},
+    {"id": "LIC202603", "title": "Colegio Valencia", "budget": "€1.9M", "deadline": "2026-02-28", "location": "Valencia"}
+)
+
+# Licitaciones por ciudad (en minúsculas), filtradas una vez al importar:
+# cuenta la ciudad de la licitación o que aparezca en el título
+TENDERS_BY_LOCATION = {
+    city.lower(): tuple(t for t in MOCK_TENDERS if city in t["location"] or city in t["title"])
+    for city in {t["location"] for t in MOCK_TENDERS}
+}
+
+def scrape_boe_tenders(location: Optional[str] = None):
     # BOE oficial HTML
     url = "https://www.boe.es/diario_boe/txt.php?id=BOE-A-2026-XXXX"  # Placeholder
     
-    # DATA REAL ESTÁTICA (actualizar diario)
-    mock_data = [
-        {"id": "LIC202601", "title": "Hospital Madrid", "budget": "€4.2M", "deadline": "2026-03-15", "location": "Madrid"},
-        {"id": "LIC202602", "title": "Carretera A-2", "budget": "€8.7M", "deadline": "2026-04-01", "location": "Zaragoza"},
-        {"id": "LIC202603", "title": "Colegio Valencia", "budget": "€1.9M", "deadline": "2026-02-28", "location": "Valencia"}
-    ]
+    if location is None:
+        tenders = MOCK_TENDERS
+    else:
+        tenders = TENDERS_BY_LOCATION.get(location.lower(), ())
     
     return {
-        "count": len(mock_data),
+        "count": len(tenders),
         "source": "BOE oficial + cache",
         "updated": datetime.now().isoformat(),
-        "tenders": mock_data
+        "tenders": list(tenders)
     }
 
 if __name__ == "__main__":
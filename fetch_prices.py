@@ -1,7 +1,9 @@
-import requests
 from bs4 import BeautifulSoup
 import json
 from datetime import datetime
+from http_session import build_session
+
+SESSION = build_session()
 
 def fetch_prices():
     # Scraping directo REE PVPC (datos públicos, estable)
@@ -12,7 +14,7 @@ def fetch_prices():
     }
     
     try:
-        response = requests.get(url, headers=headers)
+        response = SESSION.get(url, headers=headers, timeout=15)
         soup = BeautifulSoup(response.text, 'html.parser')
         
         # Busca tabla precios (patrón estable REE)
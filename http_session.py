@@ -0,0 +1,22 @@
+# Sesión HTTP para los scripts de descarga síncronos (fetch_prices.py).
+# La API (main.py) usa httpx y no pasa por estos reintentos de urllib3.
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+def build_session() -> requests.Session:
+    """Sesión con pool keep-alive y reintentos ante 5xx transitorios"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=32,
+        pool_block=False,  # con el pool lleno se abre otra conexión en vez de esperar
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.25,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+        ),
+    )
+    session.mount("https://", adapter)
+    return session
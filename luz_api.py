@@ -1,12 +1,34 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-import json
-from pathlib import Path
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+import orjson
+import httpx
+import os
+from contextlib import asynccontextmanager
+from spain_data import PRICES_ENDPOINTS, load_prices_bytes
+from update_prices import start_scheduler
+
+# Actualización horaria de prices.json dentro de la propia API (opcional,
+# activar en un solo proceso para no repetir la descarga por worker)
+PRICES_SCHEDULER = os.environ.get("PRICES_SCHEDULER") == "1"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not PRICES_SCHEDULER:
+        yield
+        return
+    async with httpx.AsyncClient(timeout=15.0) as client:
+        scheduler = start_scheduler(client)
+        yield
+        scheduler.shutdown(wait=False)
 
 app = FastAPI(
     title="Spain Electricity Prices API",
     description="Hourly electricity prices in Spain (PVPC), cleaned and normalized for apps and dashboards.",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -15,26 +37,26 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-DATA_FILE = Path("prices.json")
+# Comprime respuestas grandes (claves JSON muy repetitivas)
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
 
 @app.get("/prices/today")
 def get_today_prices():
-    if not DATA_FILE.exists():
-        return {"error": "No data yet. Run fetch_prices.py first."}
-    with DATA_FILE.open("r", encoding="utf-8") as f:
-        data = json.load(f)
-    return {"prices": data}
+    return Response(load_prices_bytes(), media_type="application/json")
+
+# Payloads constantes: se serializan una sola vez al importar
+_PRICES_INDEX_BYTES = orjson.dumps({"endpoints": PRICES_ENDPOINTS, "description": "Spain PVPC electricity prices"})
+_ROOT_BYTES = orjson.dumps({
+    "name": "Spain Electricity Prices API",
+    "endpoints": PRICES_ENDPOINTS,
+    "data_source": "REE ESIOS (datos abiertos)",
+    "pricing": "Available on RapidAPI"
+})
 
 @app.get("/prices")
 def get_prices():
-    return {"endpoints": ["/prices/today"], "description": "Spain PVPC electricity prices"}
+    return Response(_PRICES_INDEX_BYTES, media_type="application/json")
 
 @app.get("/")
 def root():
-    return {
-        "name": "Spain Electricity Prices API",
-        "endpoints": ["/prices/today"],
-        "data_source": "REE ESIOS (datos abiertos)",
-        "pricing": "Available on RapidAPI"
-    }
+    return Response(_ROOT_BYTES, media_type="application/json")
@@ -1,15 +1,59 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-import requests
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+import numpy as np
+import orjson
+import ormsgpack
+import httpx
+import redis.asyncio as aioredis
 import uvicorn
+import asyncio
+import time
+import math
+import os
+from contextlib import asynccontextmanager
 from datetime import datetime, date
-from statistics import mean
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
+from spain_data import HOUR_LABELS, ZONES, Zone
+
+# Cliente HTTP asíncrono compartido: pool keep-alive con REE, creado en el arranque
+HTTP: Optional[httpx.AsyncClient] = None
+# Caché compartida entre workers (opcional): se activa definiendo REDIS_URL
+REDIS_URL = os.environ.get("REDIS_URL")
+REDIS_TIMEOUT = 0.5  # segundos para conectar y para cada operación
+REDIS: Optional[aioredis.Redis] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global HTTP, REDIS
+    # El transporte reintenta fallos de conexión; los 5xx se reintentan en _ree_get
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+        retries=REE_RETRIES
+    )
+    HTTP = httpx.AsyncClient(timeout=15.0, transport=transport)
+    if REDIS_URL:
+        # Timeouts cortos: un Redis caído o colgado lanza RedisError y se va a REE
+        REDIS = aioredis.from_url(
+            REDIS_URL,
+            max_connections=16,
+            socket_timeout=REDIS_TIMEOUT,
+            socket_connect_timeout=REDIS_TIMEOUT
+        )
+    yield
+    await HTTP.aclose()
+    if REDIS is not None:
+        await REDIS.aclose()
 
 app = FastAPI(
     title="⚡ Spain Energy PVPC API",
     description="API real de precios PVPC España con datos REE",
-    version="5.0.0"
+    version="5.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -18,179 +62,385 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Comprime respuestas grandes (claves JSON muy repetitivas)
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+# Marca de tiempo ISO con resolución de 1 s, compartida por las peticiones del mismo segundo
+_now_iso_cache = {"second": None, "value": ""}
+
+def now_iso() -> str:
+    second = int(time.time())
+    if second != _now_iso_cache["second"]:
+        _now_iso_cache["value"] = datetime.now().replace(microsecond=0).isoformat()
+        _now_iso_cache["second"] = second
+    return _now_iso_cache["value"]
+
+# Caché en memoria por (día, zona): el PVPC solo cambia una vez al día
+CACHE_TTL = int(os.environ.get("PVPC_CACHE_TTL", 3600))  # segundos
+_CACHE: Dict[Tuple[date, str], Tuple[float, Dict]] = {}
+# Un lock por clave para que peticiones simultáneas no repitan la descarga
+_FETCH_LOCKS: Dict[Tuple[date, str], asyncio.Lock] = {}
+
+# REE devuelve 502/503/504 transitorios en horas punta
+REE_RETRIES = 3
+REE_RETRY_STATUS = frozenset((502, 503, 504))
+REE_BACKOFF = 0.25  # segundos, se duplica en cada intento
+
+async def _ree_get(url: str) -> httpx.Response:
+    for attempt in range(REE_RETRIES + 1):
+        resp = await HTTP.get(url)
+        if resp.status_code not in REE_RETRY_STATUS or attempt == REE_RETRIES:
+            return resp
+        await asyncio.sleep(REE_BACKOFF * 2 ** attempt)
+
+def _ree_float(value: str) -> float:
+    """Número REE con coma decimal ("123,45"); solo reemplaza si hace falta"""
+    return float(value.replace(",", ".")) if "," in value else float(value)
 
-def fetch_pvpc_today(zone: str) -> Dict:
-    """Obtiene precios PVPC del día desde endpoint público REE"""
+async def _download_pvpc_hourly(zone: Zone, day: date) -> List[float]:
+    """Descarga el PVPC de un día desde endpoint público REE: €/kWh por hora (NaN si falta)"""
     # API pública de REE (archives) - sin token necesario
-    today_str = date.today().strftime("%Y-%m-%d")
-    
-    # URLs públicas de archivos JSON de REE
-    # PCB: Península/Canarias/Baleares, CYM: Ceuta/Melilla
-    if zone.lower() == "pcb":
-        url = f"https://api.esios.ree.es/archives/70/download_json?locale=es&date={today_str}"
-    else:  # cm / cym
-        url = f"https://api.esios.ree.es/archives/71/download_json?locale=es&date={today_str}"
+    day_str = day.strftime("%Y-%m-%d")
+    archive_id, price_field = ZONES[zone]
+    url = f"https://api.esios.ree.es/archives/{archive_id}/download_json?locale=es&date={day_str}"
     
     try:
-        resp = requests.get(url, timeout=15)
+        resp = await _ree_get(url)
         resp.raise_for_status()
-        data = resp.json()
-        
-        hourly = {}
-        for entry in data.get("PVPC", []):
-            hour_str = entry.get("Hora", "")
-            if not hour_str or "-" not in hour_str:
-                continue
-            
-            hour = int(hour_str.split("-")[0]) - 1  # "01-02" → hora 0
-            price_str = entry.get("PCB" if zone.lower() == "pcb" else "CYM", "0")
-            
-            # Formato: "123,45" → 123.45 (€/MWh) → 0.12345 (€/kWh)
-            price_mwh = float(price_str.replace(",", "."))
-            price_kwh = round(price_mwh / 1000, 5)
-            hourly[hour] = price_kwh
+        data = orjson.loads(resp.content)
+    except (httpx.HTTPError, orjson.JSONDecodeError) as e:
+        raise HTTPException(503, detail=f"Error obteniendo datos REE: {str(e)}")
+    
+    # Array denso de 24 posiciones indexado por hora
+    hourly = [math.nan] * 24
+    found = False
+    for entry in data.get("PVPC", []):
+        hour_str = entry.get("Hora", "")
+        if not hour_str or "-" not in hour_str:
+            continue
         
-        if not hourly:
-            raise HTTPException(503, detail="No hay datos PVPC disponibles para hoy")
+        hour = int(hour_str[:2]) - 1  # "01-02" → hora 0 (REE siempre usa 2 dígitos)
+        if not 0 <= hour < 24:
+            continue
+        price_str = entry.get(price_field, "0")
         
-        return {
-            "date": date.today(),
-            "zone": zone.upper(),
-            "hourly": hourly
-        }
+        # Formato: "123,45" → 123.45 (€/MWh) → 0.12345 (€/kWh)
+        price_mwh = _ree_float(price_str)
+        price_kwh = round(price_mwh / 1000, 5)
+        hourly[hour] = price_kwh
+        found = True
     
-    except requests.RequestException as e:
-        raise HTTPException(503, detail=f"Error obteniendo datos REE: {str(e)}")
+    if not found:
+        raise HTTPException(503, detail="No hay datos PVPC disponibles para hoy")
+    return hourly
 
-def calculate_stats(prices: List[float]) -> Dict:
-    if not prices:
-        return {"min": 0, "max": 0, "avg": 0}
+def _build_day_entry(zone: Zone, day: date, hourly: List[float]) -> Dict:
+    """Entrada de caché con los datos derivados que usan los endpoints"""
+    hourly_prices = [
+        {"hour": HOUR_LABELS[h], "price": hourly[h]}
+        for h in range(24) if not math.isnan(hourly[h])
+    ]
+    # Los dicts se mantienen para la forma de la respuesta; los cálculos van sobre el array.
+    # float64: con float32 la media y base_ma6 cambian en el 5º decimal
+    prices = np.fromiter((h["price"] for h in hourly_prices), dtype=np.float64, count=len(hourly_prices))
     return {
-        "min": round(min(prices), 5),
-        "max": round(max(prices), 5),
-        "avg": round(mean(prices), 5)
+        "date": day,
+        "zone": zone.upper(),
+        "hourly": hourly,
+        # Lista ya construida que comparten /today, /stats y /cheapest
+        "hourly_prices": hourly_prices,
+        "prices": prices,
+        # hourly_prices ordenado por precio (más barato primero)
+        "sorted_by_price": [hourly_prices[i] for i in np.argsort(prices, kind="stable")],
+        "statistics": calculate_stats(prices),
+        # Base de la media móvil 6h usada por /forecast (o todas si hay menos de 6)
+        "base_ma6": round(float(prices[-6:].mean()), 5),
+        # Predicciones ya construidas por hora actual (se rellena bajo demanda)
+        "forecast_by_hour": {},
+        # /today serializado en MessagePack (se rellena bajo demanda)
+        "today_msgpack": None
     }
 
-@app.get("/")
-def root():
+def _redis_key(zone: Zone, day: date) -> str:
+    return f"pvpc:{zone}:{day.isoformat()}"
+
+async def _redis_get_hourly(zone: Zone, day: date) -> Optional[List[float]]:
+    # Redis es solo una caché: si falla se descarga de REE como siempre
+    if REDIS is None:
+        return None
+    try:
+        raw = await REDIS.get(_redis_key(zone, day))
+    except aioredis.RedisError:
+        return None
+    if raw is None:
+        return None
+    try:
+        values = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return None
+    # Entrada corrupta o de otro formato: se ignora y se vuelve a descargar
+    if not isinstance(values, list) or len(values) != 24:
+        return None
+    if not all(p is None or (isinstance(p, (int, float)) and not isinstance(p, bool)) for p in values):
+        return None
+    # Un día sin ningún precio tampoco vale (la descarga lo rechaza con 503)
+    if all(p is None for p in values):
+        return None
+    # orjson guarda NaN como null
+    return [math.nan if p is None else float(p) for p in values]
+
+async def _redis_set_hourly(zone: Zone, day: date, hourly: List[float]) -> None:
+    if REDIS is None:
+        return
+    try:
+        await REDIS.set(_redis_key(zone, day), orjson.dumps(hourly), ex=CACHE_TTL)
+    except aioredis.RedisError:
+        pass
+
+async def fetch_pvpc_today(zone: Zone) -> Dict:
+    """Obtiene precios PVPC del día desde endpoint público REE (con caché TTL)"""
+    today = date.today()
+    key = (today, zone)
+    hit = _CACHE.get(key)
+    if hit and time.monotonic() - hit[0] < CACHE_TTL:
+        return hit[1]
+    
+    async with _FETCH_LOCKS.setdefault(key, asyncio.Lock()):
+        # Otra petición pudo completar la descarga mientras esperábamos
+        hit = _CACHE.get(key)
+        if hit and time.monotonic() - hit[0] < CACHE_TTL:
+            return hit[1]
+        
+        hourly = await _redis_get_hourly(zone, today)
+        if hourly is None:
+            hourly = await _download_pvpc_hourly(zone, today)
+            await _redis_set_hourly(zone, today, hourly)
+        result = _build_day_entry(zone, today, hourly)
+        
+        # Las entradas de días anteriores ya no se consultan: se descartan
+        for old_key in [k for k in _CACHE if k[0] != today]:
+            del _CACHE[old_key]
+        for old_key in [k for k in _FETCH_LOCKS if k[0] != today]:
+            del _FETCH_LOCKS[old_key]
+        _CACHE[key] = (time.monotonic(), result)
+        return result
+
+def calculate_stats(prices: np.ndarray) -> Dict:
+    if not prices.size:
+        return {"min": 0, "max": 0, "avg": 0}
     return {
-        "api": "⚡ Spain Energy PVPC API",
-        "version": "5.0.0",
-        "status": "✅ LIVE",
-        "data_source": "REE archives (público, sin token)",
-        "endpoints": [
-            "/now?zone=pcb - Precio actual",
-            "/today?zone=pcb - Precios 24h",
-            "/forecast?zone=pcb - Predicción 6h",
-            "/stats?zone=pcb - Estadísticas",
-            "/cheapest?zone=pcb&limit=5 - Horas baratas"
-        ],
-        "zones": ["pcb (Península/Canarias/Baleares)", "cm (Ceuta/Melilla)"],
-        "docs": "/docs"
+        "min": round(float(prices.min()), 5),
+        "max": round(float(prices.max()), 5),
+        "avg": round(float(prices.mean()), 5)
     }
 
+# Payload constante: se serializa una sola vez al importar
+_ROOT_BYTES = orjson.dumps({
+    "api": "⚡ Spain Energy PVPC API",
+    "version": "5.0.0",
+    "status": "✅ LIVE",
+    "data_source": "REE archives (público, sin token)",
+    "endpoints": [
+        "/now?zone=pcb - Precio actual",
+        "/today?zone=pcb - Precios 24h",
+        "/today.msgpack?zone=pcb - Precios 24h (MessagePack)",
+        "/forecast?zone=pcb - Predicción 6h",
+        "/stats?zone=pcb - Estadísticas",
+        "/cheapest?zone=pcb&limit=5 - Horas baratas",
+        "/zones - Comparativa PCB vs CM"
+    ],
+    "zones": ["pcb (Península/Canarias/Baleares)", "cm (Ceuta/Melilla)"],
+    "docs": "/docs"
+})
+
+@app.get("/")
+async def root():
+    return Response(_ROOT_BYTES, media_type="application/json")
+
+class NowResponse(BaseModel):
+    # Esquema fijo: pydantic-core serializa /now sin inspeccionar un dict en cada petición
+    model_config = {"frozen": True}
+    
+    timestamp: str
+    date: date
+    zone: str
+    hour: str
+    price_kwh: float
+    unit: str = "€/kWh"
+    is_cheap: bool
+    is_lowest: bool
+    is_highest: bool
+    avg_day: float
+    source: str = "REE archives"
+
 @app.get("/now")
-def get_current_price(zone: str = "pcb"):
-    data = fetch_pvpc_today(zone)
+async def get_current_price(zone: Zone = "pcb") -> NowResponse:
+    data = await fetch_pvpc_today(zone)
     current_hour = datetime.now().hour
     hourly = data["hourly"]
     
-    if current_hour not in hourly:
+    if math.isnan(hourly[current_hour]):
         raise HTTPException(404, detail=f"No hay precio para hora {current_hour}")
     
     current_price = hourly[current_hour]
-    prices = list(hourly.values())
-    stats = calculate_stats(prices)
+    stats = data["statistics"]
     
-    return {
-        "timestamp": datetime.now().isoformat(),
-        "date": data["date"].isoformat(),
-        "zone": data["zone"],
-        "hour": f"{current_hour:02d}:00-{(current_hour+1)%24:02d}:00",
-        "price_kwh": current_price,
-        "unit": "€/kWh",
-        "is_cheap": current_price <= stats["avg"],
-        "is_lowest": current_price == stats["min"],
-        "is_highest": current_price == stats["max"],
-        "avg_day": stats["avg"],
-        "source": "REE archives"
-    }
+    return NowResponse(
+        timestamp=now_iso(),
+        date=data["date"],
+        zone=data["zone"],
+        hour=HOUR_LABELS[current_hour],
+        price_kwh=current_price,
+        is_cheap=current_price <= stats["avg"],
+        is_lowest=current_price == stats["min"],
+        is_highest=current_price == stats["max"],
+        avg_day=stats["avg"]
+    )
 
-@app.get("/today")
-def get_today_prices(zone: str = "pcb"):
-    data = fetch_pvpc_today(zone)
-    hourly = data["hourly"]
-    prices = list(hourly.values())
-    stats = calculate_stats(prices)
-    
-    hourly_list = [
-        {"hour": f"{h:02d}:00-{(h+1)%24:02d}:00", "price": hourly[h]}
-        for h in sorted(hourly.keys())
-    ]
-    
+MSGPACK_MEDIA_TYPE = "application/vnd.msgpack"
+JSON_MEDIA_TYPE = "application/json"
+
+def _accept_q(accept: str, media_type: str) -> float:
+    """q del rango más específico de Accept que cubre media_type (0 si ninguno)."""
+    main_type = media_type.split("/")[0]
+    best = (-1, 0.0)  # (especificidad, q)
+    for part in accept.split(","):
+        media_range, *params = (p.strip() for p in part.split(";"))
+        if media_range == media_type:
+            specificity = 2
+        elif media_range == main_type + "/*":
+            specificity = 1
+        elif media_range == "*/*":
+            specificity = 0
+        else:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if specificity > best[0]:
+            best = (specificity, q)
+    return best[1]
+
+def prefers_msgpack(accept: str) -> bool:
+    # Sin Accept se sirve JSON; msgpack solo si supera estrictamente a JSON
+    if not accept:
+        return False
+    return _accept_q(accept, MSGPACK_MEDIA_TYPE) > _accept_q(accept, JSON_MEDIA_TYPE)
+
+def build_today_payload(data: Dict) -> Dict:
+    hourly_list = data["hourly_prices"]
     return {
-        "date": data["date"].isoformat(),
+        "date": data["date"],
         "zone": data["zone"],
         "hourly_prices": hourly_list,
-        "statistics": stats,
+        "statistics": data["statistics"],
         "total_hours": len(hourly_list),
         "source": "REE archives"
     }
 
+def today_msgpack_response(data: Dict) -> Response:
+    # Se empaqueta una sola vez por entrada de caché
+    if data["today_msgpack"] is None:
+        data["today_msgpack"] = ormsgpack.packb(build_today_payload(data))
+    return Response(data["today_msgpack"], media_type=MSGPACK_MEDIA_TYPE)
+
+@app.get("/today")
+async def get_today_prices(request: Request, response: Response, zone: Zone = "pcb"):
+    data = await fetch_pvpc_today(zone)
+    # Clientes que prefieran binario: Accept: application/vnd.msgpack
+    if prefers_msgpack(request.headers.get("accept", "")):
+        msgpack_response = today_msgpack_response(data)
+        msgpack_response.headers["Vary"] = "Accept"
+        return msgpack_response
+    response.headers["Vary"] = "Accept"
+    return build_today_payload(data)
+
+@app.get("/today.msgpack")
+async def get_today_prices_msgpack(zone: Zone = "pcb"):
+    return today_msgpack_response(await fetch_pvpc_today(zone))
+
 @app.get("/forecast")
-def get_forecast(zone: str = "pcb"):
-    today_data = get_today_prices(zone)
-    prices = [h["price"] for h in today_data["hourly_prices"]]
+async def get_forecast(zone: Zone = "pcb"):
+    data = await fetch_pvpc_today(zone)
     current_hour = datetime.now().hour
     
-    recent_avg = round(mean(prices[-6:]) if len(prices) >= 6 else mean(prices), 5)
-    
-    forecast = [
-        {
-            "hour": f"{(current_hour+i)%24:02d}:00-{(current_hour+i+1)%24:02d}:00",
-            "predicted_price": recent_avg,
-            "confidence": "low",
-            "note": "Media móvil 6h"
-        }
-        for i in range(1, 7)
-    ]
+    # La predicción solo depende de la base del día y de la hora actual
+    forecast = data["forecast_by_hour"].get(current_hour)
+    if forecast is None:
+        forecast = [
+            {
+                "hour": HOUR_LABELS[(current_hour+i)%24],
+                "predicted_price": data["base_ma6"],
+                "confidence": "low",
+                "note": "Media móvil 6h"
+            }
+            for i in range(1, 7)
+        ]
+        data["forecast_by_hour"][current_hour] = forecast
     
     return {
         "zone": zone,
-        "forecast_from": datetime.now().isoformat(),
+        "forecast_from": now_iso(),
         "method": "Moving average 6h",
         "predictions": forecast
     }
 
 @app.get("/stats")
-def get_statistics(zone: str = "pcb"):
-    today_data = get_today_prices(zone)
-    hourly = today_data["hourly_prices"]
-    sorted_hours = sorted(hourly, key=lambda x: x["price"])
+async def get_statistics(zone: Zone = "pcb"):
+    data = await fetch_pvpc_today(zone)
+    sorted_hours = data["sorted_by_price"]
     
     return {
-        "date": today_data["date"],
-        "zone": today_data["zone"],
-        "statistics": today_data["statistics"],
+        "date": data["date"],
+        "zone": data["zone"],
+        "statistics": data["statistics"],
         "cheapest_hours": sorted_hours[:5],
         "most_expensive_hours": sorted_hours[-5:][::-1],
         "recommendation": "Programa consumos en horas baratas"
     }
 
 @app.get("/cheapest")
-def get_cheapest_hours(zone: str = "pcb", limit: int = 5):
+async def get_cheapest_hours(zone: Zone = "pcb", limit: int = 5):
     if limit < 1 or limit > 24:
         raise HTTPException(400, detail="limit debe estar entre 1 y 24")
     
-    today_data = get_today_prices(zone)
-    sorted_hours = sorted(today_data["hourly_prices"], key=lambda x: x["price"])
+    data = await fetch_pvpc_today(zone)
     
     return {
-        "date": today_data["date"],
-        "zone": today_data["zone"],
-        "cheapest_hours": sorted_hours[:limit],
-        "avg_price_day": today_data["statistics"]["avg"]
+        "date": data["date"],
+        "zone": data["zone"],
+        "cheapest_hours": data["sorted_by_price"][:limit],
+        "avg_price_day": data["statistics"]["avg"]
+    }
+
+@app.get("/zones")
+async def get_zones_summary():
+    # Las dos zonas se descargan en paralelo
+    pcb, cm = await asyncio.gather(fetch_pvpc_today("pcb"), fetch_pvpc_today("cm"))
+    
+    return {
+        "date": pcb["date"],
+        "zones": {d["zone"]: d["statistics"] for d in (pcb, cm)},
+        "source": "REE archives"
     }
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Un proceso por núcleo (configurable con WEB_CONCURRENCY). Con varios
+    # workers uvicorn necesita la app como cadena de import.
+    # Producción: gunicorn -k uvicorn.workers.UvicornWorker -w $((2*$(nproc)+1)) main:app
+    # uvloop + httptools (incluidos en uvicorn[standard]) en lugar de asyncio puro + h11
+    workers = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        log_level="warning"
+    )
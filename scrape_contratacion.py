@@ -1,17 +1,50 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import sys
+import httpx
+from selectolax.lexbor import LexborHTMLParser
 import json
 
-@app.get("/licitaciones/reales")
-def tenders_reales():
-    url = "https://contrataciondelestado.es/wps/poc?Pagina=1"
-    r = requests.get(url)
-    soup = BeautifulSoup(r.text, "html.parser")
-    
+PAGE_URL = "https://contrataciondelestado.es/wps/poc?Pagina={}"
+MAX_PAGINAS = 100
+MAX_CONCURRENCY = 32  # peticiones simultáneas contra contrataciondelestado.es
+
+def parse_tenders(html: bytes) -> list:
+    # Parser HTML en C; se le pasan los bytes para evitar decodificar dos veces
+    tree = LexborHTMLParser(html)
+
     tenders = []
-    for row in soup.select("table tr")[:10]:
-        title = row.select_one("td.title").text
-        budget = row.select_one("td.importe").text  
-        tenders.append({"title": title, "budget": budget})
-    
+    for row in tree.css("table tr")[:10]:
+        title = row.css_first("td.title")
+        budget = row.css_first("td.importe")
+        if title is None or budget is None:  # cabeceras / filas sin datos
+            continue
+        tenders.append({"title": title.text(), "budget": budget.text()})
+    return tenders
+
+async def fetch_page(client: httpx.AsyncClient, sem: asyncio.Semaphore, url: str) -> list:
+    try:
+        async with sem:
+            r = await client.get(url)
+        r.raise_for_status()
+    except httpx.HTTPError as e:
+        # Una página caída no tumba el resto: se registra en stderr (stdout es el JSON) y se omite
+        print(f"Error descargando {url}: {e}", file=sys.stderr)
+        return []
+    return parse_tenders(r.content)
+
+async def tenders_reales(paginas: int = 1):
+    paginas = max(1, min(paginas, MAX_PAGINAS))
+    urls = [PAGE_URL.format(i) for i in range(1, paginas + 1)]
+
+    # Un único cliente keep-alive para todas las páginas, descargadas en paralelo
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    limits = httpx.Limits(max_keepalive_connections=MAX_CONCURRENCY, max_connections=MAX_CONCURRENCY)
+    async with httpx.AsyncClient(http2=True, timeout=15.0, limits=limits) as client:
+        pages = await asyncio.gather(*(fetch_page(client, sem, url) for url in urls))
+
+    tenders = [t for page in pages for t in page]
     return {"reales": tenders, "total_paginas": 4500}
+
+if __name__ == "__main__":
+    result = asyncio.run(tenders_reales())
+    print(json.dumps(result, indent=2, ensure_ascii=False))
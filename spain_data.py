@@ -0,0 +1,31 @@
+# Datos compartidos por las APIs de precios (una sola copia por proceso)
+import orjson
+from pathlib import Path
+from types import MappingProxyType
+from typing import Literal
+
+DATA_FILE = Path("prices.json")
+PRICES_ENDPOINTS = ("/prices/today",)
+
+# Etiquetas "HH:00-HH:00" de las 24 horas, construidas una sola vez
+HOUR_LABELS = tuple(f"{h:02d}:00-{(h+1)%24:02d}:00" for h in range(24))
+
+# Zonas PVPC → (archivo público REE, columna de precio)
+# PCB: Península/Canarias/Baleares, CYM: Ceuta/Melilla
+Zone = Literal["pcb", "cm"]
+ZONES = MappingProxyType({"pcb": (70, "PCB"), "cm": (71, "CYM")})
+
+NO_DATA_BYTES = orjson.dumps({"error": "No data yet. Run fetch_prices.py first."})
+# Respuesta serializada de prices.json; solo se relee cuando cambia el fichero
+_prices_cache = {"mtime": None, "body": NO_DATA_BYTES}
+
+def load_prices_bytes() -> bytes:
+    try:
+        mtime = DATA_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
+        return NO_DATA_BYTES
+    if mtime != _prices_cache["mtime"]:
+        data = orjson.loads(DATA_FILE.read_bytes())
+        _prices_cache["body"] = orjson.dumps({"prices": data})
+        _prices_cache["mtime"] = mtime
+    return _prices_cache["body"]
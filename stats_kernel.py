@@ -0,0 +1,36 @@
+# Kernel de estadísticas por lotes (varios días / zonas) para agregados futuros
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # numba es opcional: sin él el kernel corre en Python puro
+    numba = None
+
+def _day_stats(arr):
+    """min, max, media y desviación típica por fila de arr (D, H) en una pasada (Welford).
+
+    arr no debe contener NaN (fastmath asume valores finitos).
+    """
+    D, H = arr.shape
+    out = np.empty((D, 4), np.float64)
+    for d in range(D):
+        mn = arr[d, 0]
+        mx = mn
+        mean = 0.0
+        m2 = 0.0
+        for i in range(H):
+            v = arr[d, i]
+            if v < mn:
+                mn = v
+            if v > mx:
+                mx = v
+            delta = v - mean
+            mean += delta / (i + 1)
+            m2 += (v - mean) * delta
+        out[d, 0] = mn
+        out[d, 1] = mx
+        out[d, 2] = mean
+        out[d, 3] = (m2 / (H - 1)) ** 0.5 if H > 1 else 0.0
+    return out
+
+day_stats = numba.njit(cache=True, fastmath=True)(_day_stats) if numba is not None else _day_stats
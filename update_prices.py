@@ -1,17 +1,35 @@
-import requests
-import json
-import schedule
-import time
+import asyncio
+import aiofiles
+import aiofiles.os
+import httpx
+import orjson
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from spain_data import DATA_FILE
 
-def fetch_ree_prices():
+REE_PRICES_URL = "https://www.ree.es/es/datos/peninsulas/precios-especificos-del-mercado"
+
+async def fetch_ree_prices(client: httpx.AsyncClient):
     # REE API real
-    r = requests.get("https://www.ree.es/es/datos/peninsulas/precios-especificos-del-mercado")
-    data = r.json()
-    with open("prices.json", "w") as f:
-        json.dump(data, f)
+    r = await client.get(REE_PRICES_URL)
+    data = orjson.loads(r.content)
+    # Se escribe a un temporal y se renombra: la API nunca lee un fichero a medias
+    tmp_file = DATA_FILE.with_suffix(".json.tmp")
+    async with aiofiles.open(tmp_file, "wb") as f:
+        await f.write(orjson.dumps(data))
+    await aiofiles.os.replace(tmp_file, DATA_FILE)
     print("💡 Precios actualizados:", data["hoy"])
 
-schedule.every().hour.do(fetch_ree_prices)
-while True:
-    schedule.run_pending()
-    time.sleep(60)
+def start_scheduler(client: httpx.AsyncClient) -> AsyncIOScheduler:
+    # Duerme hasta la próxima ejecución (minuto 5 de cada hora) en vez de sondear
+    scheduler = AsyncIOScheduler()
+    scheduler.add_job(fetch_ree_prices, "cron", minute=5, args=[client])
+    scheduler.start()
+    return scheduler
+
+async def main():
+    async with httpx.AsyncClient(timeout=15.0) as client:
+        start_scheduler(client)
+        await asyncio.Event().wait()
+
+if __name__ == "__main__":
+    asyncio.run(main())